@@ -1,11 +1,26 @@
 import streamlit as st
-import gspread
-from google.oauth2.service_account import Credentials
 import pandas as pd
-import folium
-from streamlit_folium import st_folium
+import numpy as np
+import streamlit.components.v1 as components
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
+import io
+import csv
+import html
+import unicodedata
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+    _json_loads = json.loads
 
 def check_password():
     """Retourne True si l'utilisateur a entré le bon mot de passe."""
@@ -43,6 +58,11 @@ if not check_password():
 # ============================================================================
 SHEET_URL = "https://docs.google.com/spreadsheets/d/1ADrY7zDRoDnn_7piQc-xQzMrHgFvqfG1I6YtvOYM4xw/edit?gid=0#gid=0"
 SHEET_ID = "1ADrY7zDRoDnn_7piQc-xQzMrHgFvqfG1I6YtvOYM4xw"
+SHEET_HEADERS = ['Adresse', 'Latitude', 'Longitude', 'Note']
+SHEET_SCOPES = [
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/drive"
+]
 
 # Constantes géographiques pour la France métropolitaine
 FRANCE_LAT_MIN, FRANCE_LAT_MAX = 41.0, 51.5
@@ -50,6 +70,10 @@ FRANCE_LON_MIN, FRANCE_LON_MAX = -5.5, 10.0
 FRANCE_CENTER = [46.603354, 1.888334]
 FRANCE_ZOOM = 6
 
+# Fonds de carte et style des marqueurs
+SATELLITE_TILES_URL = 'https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}'
+MARKER_ICON_OPTIONS = {'color': 'red', 'icon': 'home', 'prefix': 'fa'}
+
 # Seuils de confiance pour le géocodage
 GEOCODE_SCORE_MIN = 0.4
 GEOCODE_SCORE_FALLBACK = 0.3
@@ -57,7 +81,107 @@ GEOCODE_SCORE_FALLBACK = 0.3
 # Configuration des API
 API_ADRESSE_URL = "https://api-adresse.data.gouv.fr/search/"
 PHOTON_API_URL = "https://photon.komoot.io/api/"
-API_TIMEOUT = 10
+API_ADRESSE_CSV_URL = "https://api-adresse.data.gouv.fr/search/csv/"
+API_TIMEOUT = (2, 4)  # (connexion, lecture) : échouer vite plutôt que bloquer la saisie
+API_BULK_TIMEOUT = 60
+API_ADRESSE_DEADLINE = 1.0  # au-delà, Photon est interrogé sans attendre l'API Adresse
+
+# Import CSV : séparateurs détectés quand la virgule ne donne pas de colonne Adresse
+CSV_DELIMITERS = ',;\t'
+
+# Expressions régulières précompilées
+_WS_RE = re.compile(r'\s+')
+_COMBINING_RE = re.compile(r'[\u0300-\u036f]')
+_NOTE_RE = re.compile(r'\s*\(([^)]+)\)')
+_NOT_ADDRESS_RE = re.compile(r'https?://|www\.|\S+@\S+', re.IGNORECASE)
+HTTP_USER_AGENT = "StreamlitAddressManager/1.0"
+
+# Intervalle minimal entre deux appels à un même service (politiques d'usage)
+API_ADRESSE_MIN_INTERVAL = 1 / 50  # 50 requêtes/s par IP
+PHOTON_MIN_INTERVAL = 0.1
+
+# Nombre maximal de géocodages simultanés en mode batch
+BATCH_GEOCODE_WORKERS = 8
+GEOCODE_POOL_WORKERS = 16  # pool partagé par toutes les sessions
+
+# Version du cache disque de géocodage : l'incrémenter quand les règles
+# d'acceptation changent pour ignorer les résultats enregistrés auparavant
+GEOCODE_CACHE_VERSION = 2
+
+# Écritures Google Sheets : erreurs transitoires (429, 5xx) rejouées avec backoff
+SHEETS_WRITE_ATTEMPTS = 5
+SHEETS_RETRY_MIN_WAIT = 1
+SHEETS_RETRY_MAX_WAIT = 30
+
+# Gabarits HTML des popups de marqueurs
+POPUP_TEMPLATE = """
+    <div style="font-family: Arial; min-width: 250px;">
+        <h4 style="margin-bottom: 10px; color: #2c3e50;">{address}</h4>
+        {note_block}
+        <p style="margin: 10px 0; font-size: 12px; color: #95a5a6;">
+            📍 Lat: {lat:.6f}, Lon: {lon:.6f}
+        </p>
+        <hr style="margin: 10px 0; border: none; border-top: 1px solid #ecf0f1;">
+        <a href="https://www.google.com/maps?layer=c&cbll={lat},{lon}" target="_blank" 
+           style="display: inline-block; padding: 8px 15px; background-color: #3498db; 
+                  color: white; text-decoration: none; border-radius: 5px; 
+                  text-align: center; font-weight: bold;">
+            🗺️ Voir dans Street View
+        </a>
+    </div>
+"""
+POPUP_NOTE_TEMPLATE = """
+        <p style="margin: 5px 0; color: #7f8c8d;">
+            <b>📝 Note:</b> <i>{note}</i>
+        </p>
+"""
+
+# Construction JS d'un marqueur pour FastMarkerCluster : [lat, lon, popup, tooltip]
+# L'icône est créée une seule fois et partagée par tous les marqueurs
+MARKER_CALLBACK_JS = """
+(function () {
+    var icon = L.AwesomeMarkers.icon({icon: 'home', prefix: 'fa', markerColor: 'red'});
+    return function (row) {
+        var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+        marker.bindPopup(row[2], {maxWidth: 300});
+        marker.bindTooltip(row[3]);
+        return marker;
+    };
+})()
+"""
+
+# Variante cercle (sans icône) pour les grands volumes, voir CIRCLE_MARKER_THRESHOLD
+CIRCLE_MARKER_CALLBACK_JS = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]),
+        {radius: 6, color: 'red', fill: true, fillOpacity: 0.9});
+    marker.bindPopup(row[2], {maxWidth: 300});
+    marker.bindTooltip(row[3]);
+    return marker;
+}
+"""
+
+# Affichage des coordonnées dans les tableaux (formatage côté navigateur, sans copie)
+COORDINATES_COLUMN_CONFIG = {
+    'Latitude': st.column_config.NumberColumn(format="%.6f"),
+    'Longitude': st.column_config.NumberColumn(format="%.6f"),
+}
+
+# Au-delà de ce nombre d'adresses, des cercles (sans icône) remplacent les marqueurs
+CIRCLE_MARKER_THRESHOLD = 100
+
+# Options Leaflet.markercluster : création des marqueurs par lots pour garder
+# la page réactive, clusters dissous au zoom rue
+MARKER_CLUSTER_OPTIONS = {
+    'chunkedLoading': True,
+    'chunkInterval': 100,
+    'chunkDelay': 20,
+    'maxClusterRadius': 60,
+    'disableClusteringAtZoom': 16,
+}
+
+# Au-delà de ce nombre d'adresses, la carte WebGL (st.map) est proposée par défaut
+SIMPLE_MAP_THRESHOLD = 1000
 
 # ============================================================================
 # Configuration de la page
@@ -81,43 +205,59 @@ def parse_addresses_with_notes(input_text):
         if not addr:
             continue
             
-        note_match = re.search(r'\(([^)]+)\)', addr)
-        
-        if note_match:
-            note = note_match.group(1).strip()
-            address_clean = re.sub(r'\s*\([^)]+\)', '', addr).strip()
+        if '(' in addr:
+            # Un seul passage : [texte, note, texte, note, ..., texte]
+            parts = _NOTE_RE.split(addr)
+            note = parts[1].strip() if len(parts) > 1 else ""
+            address_clean = ''.join(parts[::2]).strip()
         else:
             note = ""
-            address_clean = addr.strip()
+            address_clean = addr
         
         if address_clean:
             parsed.append((address_clean, note))
     
     return parsed
 
-def normalize_coordinate(value):
-    """Normalise une coordonnée"""
+def looks_geocodable(address):
+    """
+    Filtre local avant tout appel réseau : écarte les saisies qui ne peuvent
+    pas être des adresses (trop courtes, sans lettre, URL ou e-mail)
+    """
+    address = address.strip()
+    return (
+        len(address) >= 3
+        and any(c.isalpha() for c in address)
+        and not _NOT_ADDRESS_RE.search(address)
+    )
+
+def normalize_coordinates(values):
+    """
+    Normalise une colonne de coordonnées (cellules texte ou nombres)
+    Les cellules vides ou invalides deviennent NaN, les micro-degrés sont convertis
+    """
+    raw = values.to_numpy(dtype=object)
+    coords = np.full(len(raw), np.nan)
+    filled = raw != ''
     try:
-        coord = float(value)
-        if abs(coord) > 360:
-            coord = coord / 1000000
-        return coord
+        coords[filled] = np.asarray(raw[filled], dtype=np.float64)
     except (ValueError, TypeError):
-        return None
+        # Cellule non numérique : conversion tolérante, plus lente
+        coords = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+    
+    # Coordonnées stockées en micro-degrés
+    return np.where(np.abs(coords) > 360, coords / 1000000, coords)
 
-def correct_paris_longitude(lat, lon, address):
+def correct_paris_longitudes(lat, lon, addresses):
     """
-    Corrige automatiquement les longitudes incorrectes pour Paris
-    Retourne la longitude corrigée
+    Corrige les longitudes parisiennes tronquées (chiffre '2' perdu) sur des colonnes pandas
+    Adresse parisienne (« paris » ou « 75 ») avec 0 < lon < 1 : lon + 2 si le résultat reste en France
     """
-    # Vérifier si c'est une adresse parisienne avec longitude suspecte
-    if lat and lon:
-        if ("paris" in str(address).lower() or "75" in str(address)) and (0 < lon < 1):
-            # Probable perte du chiffre '2' au début
-            corrected_lon = lon + 2
-            if FRANCE_LON_MIN <= corrected_lon <= FRANCE_LON_MAX:
-                return corrected_lon
-    return lon
+    addresses = addresses.astype(str)
+    is_paris = addresses.str.lower().str.contains('paris', regex=False) | addresses.str.contains('75', regex=False)
+    corrected = lon + 2
+    mask = is_paris & (lat != 0) & (lon > 0) & (lon < 1) & corrected.between(FRANCE_LON_MIN, FRANCE_LON_MAX)
+    return lon.where(~mask, corrected)
 
 def validate_france_coordinates(lat, lon, address=""):
     """
@@ -150,64 +290,68 @@ def is_in_france(lat, lon):
     return (FRANCE_LAT_MIN <= lat <= FRANCE_LAT_MAX and 
             FRANCE_LON_MIN <= lon <= FRANCE_LON_MAX)
 
-def create_empty_france_map(tile_layer='OpenStreetMap'):
-    """Crée une carte vide centrée sur la France avec choix de layer"""
-    m = folium.Map(
-        location=FRANCE_CENTER,
-        zoom_start=FRANCE_ZOOM,
-        tiles=tile_layer
+def is_in_france_vec(lat, lon):
+    """Version vectorisée de is_in_france : retourne un masque booléen NumPy"""
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    return ((lat >= FRANCE_LAT_MIN) & (lat <= FRANCE_LAT_MAX) &
+            (lon >= FRANCE_LON_MIN) & (lon <= FRANCE_LON_MAX))
+
+def create_thread_pool(max_workers):
+    """Crée un pool de threads qui partagent le contexte Streamlit du script"""
+    ctx = get_script_run_ctx()
+    return ThreadPoolExecutor(
+        max_workers=max_workers,
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)
     )
+
+def add_base_layers(m):
+    """Ajoute les fonds Standard/Satellite et le contrôle de couches à une carte"""
+    import folium
     
-    # Ajouter le contrôle de couches
     folium.TileLayer('OpenStreetMap', name='Standard').add_to(m)
     folium.TileLayer(
-        tiles='https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}',
+        tiles=SATELLITE_TILES_URL,
         attr='Esri',
         name='Satellite',
         overlay=False,
         control=True
     ).add_to(m)
     folium.LayerControl().add_to(m)
+
+def create_empty_france_map(tile_layer='OpenStreetMap'):
+    """Crée une carte vide centrée sur la France avec choix de layer"""
+    import folium  # import différé : seule la page carte en a besoin
+    
+    m = folium.Map(
+        location=FRANCE_CENTER,
+        zoom_start=FRANCE_ZOOM,
+        tiles=tile_layer
+    )
+    
+    add_base_layers(m)
     
     return m
 
+def build_popup_html(lat, lon, address, note=""):
+    """Construit le contenu HTML de la popup d'un marqueur avec Street View"""
+    # Échappement unique ici : le texte saisi ne peut pas injecter de balises
+    note_block = POPUP_NOTE_TEMPLATE.format(note=html.escape(note)) if note else ""
+    return POPUP_TEMPLATE.format(address=html.escape(address), note_block=note_block, lat=lat, lon=lon)
+
+def build_tooltip_text(address, note=""):
+    """Texte affiché au survol d'un marqueur"""
+    return html.escape(f"{address} ({note})" if note else address)
+
 def create_marker(lat, lon, address, note=""):
     """Crée un marqueur Folium avec Street View"""
-    street_view_url = f"https://www.google.com/maps?layer=c&cbll={lat},{lon}"
-    
-    popup_html = f"""
-    <div style="font-family: Arial; min-width: 250px;">
-        <h4 style="margin-bottom: 10px; color: #2c3e50;">{address}</h4>
-    """
-    
-    if note:
-        popup_html += f"""
-        <p style="margin: 5px 0; color: #7f8c8d;">
-            <b>📝 Note:</b> <i>{note}</i>
-        </p>
-        """
-    
-    popup_html += f"""
-        <p style="margin: 10px 0; font-size: 12px; color: #95a5a6;">
-            📍 Lat: {lat:.6f}, Lon: {lon:.6f}
-        </p>
-        <hr style="margin: 10px 0; border: none; border-top: 1px solid #ecf0f1;">
-        <a href="{street_view_url}" target="_blank" 
-           style="display: inline-block; padding: 8px 15px; background-color: #3498db; 
-                  color: white; text-decoration: none; border-radius: 5px; 
-                  text-align: center; font-weight: bold;">
-            🗺️ Voir dans Street View
-        </a>
-    </div>
-    """
-    
-    tooltip_text = f"{address} ({note})" if note else address
+    import folium
     
     return folium.Marker(
         location=[lat, lon],
-        popup=folium.Popup(popup_html, max_width=300),
-        tooltip=tooltip_text,
-        icon=folium.Icon(color='red', icon='home', prefix='fa')
+        popup=folium.Popup(build_popup_html(lat, lon, address, note), max_width=300),
+        tooltip=build_tooltip_text(address, note),
+        icon=folium.Icon(**MARKER_ICON_OPTIONS)
     )
 
 # ============================================================================
@@ -217,23 +361,16 @@ def create_marker(lat, lon, address, note=""):
 @st.cache_resource
 def connect_to_google_sheet():
     """Initialise la connexion au Google Sheet"""
+    # Imports différés : l'écran de connexion s'affiche sans charger la pile Google
+    import gspread
+    from google.oauth2.service_account import Credentials
+    
     try:
-        scope = [
-            "https://spreadsheets.google.com/feeds",
-            "https://www.googleapis.com/auth/drive"
-        ]
-        
         creds_dict = dict(st.secrets["gcp_service_account"])
-        creds = Credentials.from_service_account_info(creds_dict, scopes=scope)
+        creds = Credentials.from_service_account_info(creds_dict, scopes=SHEET_SCOPES)
         client = gspread.authorize(creds)
         sheet = client.open_by_key(SHEET_ID).sheet1
-        
-        try:
-            headers = sheet.row_values(1)
-            if not headers or headers != ['Adresse', 'Latitude', 'Longitude', 'Note']:
-                sheet.update('A1:D1', [['Adresse', 'Latitude', 'Longitude', 'Note']])
-        except:
-            sheet.update('A1:D1', [['Adresse', 'Latitude', 'Longitude', 'Note']])
+        ensure_sheet_headers(sheet, SHEET_ID)
         
         return sheet
     except Exception as e:
@@ -241,156 +378,430 @@ def connect_to_google_sheet():
         st.info("Assurez-vous que les secrets sont correctement configurés.")
         return None
 
+@st.cache_data(ttl=24 * 3600, show_spinner=False)
+def ensure_sheet_headers(_sheet, sheet_id):
+    """
+    Vérifie (et rétablit si besoin) la ligne d'en-têtes du Google Sheet
+    Mis en cache une journée par identifiant de feuille : un seul aller-retour par jour
+    """
+    from gspread.exceptions import APIError
+    
+    try:
+        header_values = _sheet.get('A1:D1')
+        headers = header_values[0] if header_values else []
+    except APIError:
+        headers = []  # Plage illisible : on réécrit les en-têtes
+    
+    if headers != SHEET_HEADERS:
+        _sheet.update(values=[SHEET_HEADERS], range_name='A1:D1')
+    return True
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_addresses(_sheet, sheet_id):
+    """
+    Lit toutes les valeurs du Google Sheet (colonnes A à D) et les met en forme
+    Valeurs non formatées : les coordonnées arrivent directement en nombres
+    Mis en cache 60 s par identifiant de feuille (DataFrame déjà nettoyé),
+    invalidé après chaque écriture : les reruns et changements de page ne refont
+    ni l'appel réseau ni le nettoyage
+    """
+    from gspread.utils import ValueRenderOption
+    
+    values = _sheet.get_values('A:D', value_render_option=ValueRenderOption.unformatted)
+    if len(values) < 2:
+        return pd.DataFrame(columns=SHEET_HEADERS)
+    
+    df = pd.DataFrame(values[1:], columns=values[0])
+    if 'Note' not in df.columns:
+        df['Note'] = ''
+    
+    # Normaliser les coordonnées
+    df['Latitude'] = normalize_coordinates(df['Latitude'])
+    df['Longitude'] = normalize_coordinates(df['Longitude'])
+    df = df.dropna(subset=['Latitude', 'Longitude'])
+    df['Note'] = df['Note'].fillna('')
+    
+    # Corriger automatiquement les longitudes parisiennes
+    df['Longitude'] = correct_paris_longitudes(df['Latitude'], df['Longitude'], df['Adresse'])
+    
+    # Masque France calculé une fois, réutilisé par la page carte et display_map
+    df['_in_france'] = is_in_france_vec(df['Latitude'], df['Longitude'])
+    
+    # Clé normalisée calculée une fois, pour réutiliser les coordonnées déjà connues
+    df['_key'] = normalize_addresses(df['Adresse'])
+    
+    return df
+
 def get_all_addresses(sheet):
     """Récupère toutes les adresses depuis le Google Sheet avec correction automatique"""
     try:
-        data = sheet.get_all_records()
-        if data:
-            df = pd.DataFrame(data)
-            if not df.empty:
-                if 'Note' not in df.columns:
-                    df['Note'] = ''
-                
-                # Normaliser les coordonnées
-                df['Latitude'] = df['Latitude'].apply(normalize_coordinate)
-                df['Longitude'] = df['Longitude'].apply(normalize_coordinate)
-                df = df.dropna(subset=['Latitude', 'Longitude'])
-                df['Note'] = df['Note'].fillna('')
-                
-                # NOUVEAU: Corriger automatiquement les longitudes parisiennes
-                df['Longitude'] = df.apply(
-                    lambda row: correct_paris_longitude(row['Latitude'], row['Longitude'], row['Adresse']),
-                    axis=1
-                )
-                
-                return df
-        return pd.DataFrame(columns=['Adresse', 'Latitude', 'Longitude', 'Note'])
+        return fetch_addresses(sheet, SHEET_ID)
     except Exception as e:
         st.error(f"❌ Erreur lors de la récupération des données : {e}")
-        return pd.DataFrame(columns=['Adresse', 'Latitude', 'Longitude', 'Note'])
+        return pd.DataFrame(columns=SHEET_HEADERS)
 
 # ============================================================================
 # GÉOCODAGE
 # ============================================================================
 
-def try_api_adresse(address):
-    """Tente de géocoder avec l'API Adresse officielle"""
+@st.cache_resource
+def get_http_session():
+    """Session HTTP partagée (keep-alive) pour réutiliser les connexions TLS"""
+    session = requests.Session()
+    session.headers.update({'User-Agent': HTTP_USER_AGENT})
+    retry = Retry(
+        total=1,
+        backoff_factor=0.2,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+    )
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retry)
+    session.mount('https://', adapter)
+    return session
+
+@st.cache_resource
+def get_geocode_executor():
+    """Pool de threads partagé pour les requêtes à l'API Adresse (aucun appel st.*)"""
+    return ThreadPoolExecutor(max_workers=GEOCODE_POOL_WORKERS)
+
+@st.cache_resource
+def get_rate_limiter_state():
+    """État partagé du limiteur de débit (conservé entre les reruns)"""
+    return {'lock': threading.Lock(), 'next_slot': {}}
+
+def throttle(service_url, min_interval):
+    """
+    Espace les appels à un même service d'au moins min_interval secondes
+    N'attend que le temps restant depuis le dernier appel (aucune attente à froid)
+    """
+    state = get_rate_limiter_state()
+    with state['lock']:
+        now = time.monotonic()
+        slot = max(now, state['next_slot'].get(service_url, 0.0))
+        state['next_slot'][service_url] = slot + min_interval
+    
+    if slot > now:
+        time.sleep(slot - now)
+
+def _geocode(url, params, min_interval):
+    """
+    Requête commune aux géocodeurs (format GeoJSON), les erreurs transitoires
+    sont rejouées par le Retry monté sur la session partagée
+    Renvoie (lat, lon, properties) du premier résultat en France, sinon None
+    """
+    throttle(url, min_interval)
     try:
-        params = {'q': address, 'limit': 1}
-        response = requests.get(API_ADRESSE_URL, params=params, timeout=API_TIMEOUT)
-        
-        if response.status_code == 200:
-            data = response.json()
-            features = data.get('features', [])
-            
-            if features:
-                feature = features[0]
-                coords = feature['geometry']['coordinates']
-                properties = feature['properties']
-                
-                lat, lon = coords[1], coords[0]
-                score = properties.get('score', 0)
-                
-                if not is_in_france(lat, lon):
-                    return None
-                
-                if score >= GEOCODE_SCORE_MIN or score >= GEOCODE_SCORE_FALLBACK:
-                    return lat, lon
-    except Exception:
-        pass
+        response = get_http_session().get(url, params=params, timeout=API_TIMEOUT)
+        response.raise_for_status()
+        features = _json_loads(response.content).get('features', [])
+    except (requests.RequestException, ValueError, AttributeError):
+        return None
     
-    return None
+    if not features:
+        return None
+    
+    # Réponse au format inattendu : traitée comme une absence de résultat
+    try:
+        feature = features[0]
+        lon, lat = feature['geometry']['coordinates'][:2]
+        if not is_in_france(lat, lon):
+            return None
+        return lat, lon, feature.get('properties') or {}
+    except (KeyError, IndexError, TypeError, ValueError, AttributeError):
+        return None
+
+def try_api_adresse(address):
+    """
+    Tente de géocoder avec l'API Adresse officielle
+    Retourne (lat, lon, score), ou None si le score est sous GEOCODE_SCORE_FALLBACK
+    """
+    result = _geocode(API_ADRESSE_URL, {'q': address, 'limit': 1}, API_ADRESSE_MIN_INTERVAL)
+    if result is None:
+        return None
+    
+    lat, lon, properties = result
+    score = properties.get('score', 0)
+    if score < GEOCODE_SCORE_FALLBACK:
+        return None
+    return lat, lon, score
 
 def try_photon_api(address):
     """Tente de géocoder avec Photon API"""
-    try:
-        params = {'q': address, 'limit': 1, 'lang': 'fr', 'location_bias_scale': 0.5}
-        response = requests.get(PHOTON_API_URL, params=params, timeout=API_TIMEOUT)
-        
-        if response.status_code == 200:
-            data = response.json()
-            features = data.get('features', [])
-            
-            if features:
-                feature = features[0]
-                coords = feature['geometry']['coordinates']
-                properties = feature['properties']
-                
-                lat, lon = coords[1], coords[0]
-                
-                if is_in_france(lat, lon):
-                    country = properties.get('country', '').lower()
-                    if country in ['france', 'fr', '']:
-                        return lat, lon
-    except Exception:
-        pass
+    params = {'q': address, 'limit': 1, 'lang': 'fr', 'location_bias_scale': 0.5}
+    result = _geocode(PHOTON_API_URL, params, PHOTON_MIN_INTERVAL)
+    if result is None:
+        return None
     
+    lat, lon, properties = result
+    if properties.get('country', '').lower() in ['france', 'fr', '']:
+        return lat, lon
     return None
 
-def geocode_address_france(address):
-    """Convertit une adresse française en coordonnées"""
-    if not address.strip():
-        return None, None
+def normalize_address(address):
+    """Normalise une adresse (casse, espaces, accents) pour servir de clé de cache"""
+    decomposed = unicodedata.normalize('NFKD', address.strip().lower())
+    return _WS_RE.sub(' ', _COMBINING_RE.sub('', decomposed))
+
+def normalize_addresses(addresses):
+    """Version vectorisée de normalize_address pour une colonne d'adresses"""
+    return (
+        addresses.astype(str).str.strip().str.lower()
+        .str.normalize('NFKD')
+        .str.replace(_COMBINING_RE, '', regex=True)
+        .str.replace(_WS_RE, ' ', regex=True)
+    )
+
+@st.cache_data(persist="disk", max_entries=50000, show_spinner=False)
+def _geocode_cached(address_normalized, cache_version, _query, _bulk_found=False):
+    """
+    Géocodage pur (aucun appel st.*), mis en cache par adresse normalisée et version
+    _query (hors clé de cache) est le texte saisi, envoyé tel quel aux services
+    _bulk_found (hors clé de cache) : résultat (lat, lon, score) du lot CSV, ou None
+    si le lot n'a rien trouvé ; l'API Adresse n'est alors pas réinterrogée
+    Lève LookupError en cas d'échec pour ne pas mettre l'échec en cache
+    """
+    if _bulk_found is not False:
+        found, fallback, late = _bulk_found, None, False
+    else:
+        # Photon (service en usage raisonnable) n'est sollicité que si l'API Adresse
+        # ne trouve rien, renvoie un score faible ou dépasse API_ADRESSE_DEADLINE
+        primary = get_geocode_executor().submit(try_api_adresse, _query)
+        late = not wait([primary], timeout=API_ADRESSE_DEADLINE).done
+        fallback = try_photon_api(_query) if late else None
+        found = primary.result()
+    if found and found[2] >= GEOCODE_SCORE_MIN:
+        return found[:2]
     
-    result = try_api_adresse(address)
+    if not late:
+        fallback = try_photon_api(_query)
+    # Score faible : Photon d'abord, le résultat de l'API Adresse en dernier recours
+    result = fallback or (found[:2] if found else None)
     if result:
         return result
     
-    result = try_photon_api(address)
-    if result:
-        return result
+    raise LookupError(address_normalized)
+
+def geocode_address_france(address, bulk_found=False):
+    """
+    Convertit une adresse française en coordonnées
+    bulk_found : résultat déjà obtenu par bulk_geocode_france (voir _geocode_cached)
+    """
+    if not address.strip():
+        return None, None
+    
+    try:
+        return _geocode_cached(
+            normalize_address(address), GEOCODE_CACHE_VERSION,
+            _query=address.strip(), _bulk_found=bulk_found
+        )
+    except LookupError:
+        return None, None
+
+def bulk_geocode_france(addresses):
+    """
+    Géocode une liste d'adresses en un seul appel au endpoint CSV de l'API Adresse
+    Retourne un DataFrame aligné sur la liste (colonnes latitude, longitude, result_score)
+    """
+    buf = io.StringIO()
+    pd.DataFrame({'adresse': addresses}).to_csv(buf, index=False)
+    response = get_http_session().post(
+        API_ADRESSE_CSV_URL,
+        files={'data': ('adresses.csv', buf.getvalue())},
+        data={'columns': 'adresse'},
+        timeout=API_BULK_TIMEOUT
+    )
+    response.raise_for_status()
+    return pd.read_csv(io.StringIO(response.text), dtype={'adresse': str})
+
+def known_rows(existing_df):
+    """Lignes du Google Sheet réutilisables telles quelles (coordonnées en France)"""
+    if existing_df is None or existing_df.empty or '_key' not in existing_df.columns:
+        return None
+    return existing_df[existing_df['_in_france']]
+
+def known_coordinates(existing_df):
+    """Index {adresse normalisée: (lat, lon)} des adresses déjà enregistrées en France"""
+    rows = known_rows(existing_df)
+    if rows is None:
+        return {}
+    
+    index = {}
+    for key, lat, lon in zip(rows['_key'].tolist(), rows['Latitude'].tolist(), rows['Longitude'].tolist()):
+        index.setdefault(key, (float(lat), float(lon)))
+    return index
+
+def find_known_coordinates(existing_df, address):
+    """Retourne (lat, lon) si l'adresse figure déjà dans le Google Sheet (en France), sinon None"""
+    rows = known_rows(existing_df)
+    if rows is None:
+        return None
     
-    return None, None
+    match = rows.loc[rows['_key'] == normalize_address(address)]
+    if match.empty:
+        return None
+    return float(match['Latitude'].iloc[0]), float(match['Longitude'].iloc[0])
+
+def locate_address(address, existing_df=None):
+    """Réutilise les coordonnées déjà enregistrées, sinon géocode l'adresse"""
+    known = find_known_coordinates(existing_df, address)
+    if known:
+        return known
+    return geocode_address_france(address)
 
 # ============================================================================
 # GESTION DES ADRESSES
 # ============================================================================
 
-def add_addresses_batch(sheet, addresses_with_notes):
-    """Ajoute plusieurs adresses en mode batch"""
-    results = {'success': [], 'failed': [], 'corrected': []}
+def with_sheets_retry(func, *args, recheck=None, **kwargs):
+    """
+    Exécute une écriture Google Sheets en rejouant les refus de quota (429),
+    renvoyés avant toute écriture (backoff exponentiel de 1 à 30 s, 5 tentatives au plus)
+    Une erreur 5xx peut survenir alors que l'écriture a déjà été appliquée : elle n'est
+    rejouée que si recheck est fourni et confirme, avant chaque nouvelle tentative,
+    que le sheet n'a pas bougé ; sinon elle remonte, comme toute autre erreur
+    """
+    from gspread.exceptions import APIError
     
-    progress_bar = st.progress(0)
-    status_text = st.empty()
+    for attempt in range(SHEETS_WRITE_ATTEMPTS):
+        try:
+            return func(*args, **kwargs)
+        except APIError as e:
+            status = e.response.status_code
+            server_error = status >= 500 and recheck is not None
+            if not (status == 429 or server_error) or attempt == SHEETS_WRITE_ATTEMPTS - 1:
+                raise
+            time.sleep(min(SHEETS_RETRY_MAX_WAIT, SHEETS_RETRY_MIN_WAIT * 2 ** attempt))
+            if server_error and not recheck():
+                raise
+
+def add_addresses_bulk(sheet, geocoded_rows):
+    """Écrit plusieurs lignes [adresse, lat, lon, note] en un seul appel API"""
+    with_sheets_retry(sheet.append_rows, geocoded_rows, value_input_option='USER_ENTERED')
+    fetch_addresses.clear()
+
+def write_geocoded_addresses(sheet, geocoded):
+    """
+    Valide une liste de (adresse, note, lat, lon) puis écrit les lignes valides
+    dans le Google Sheet en un seul appel
+    Retourne {'success': [...], 'failed': [...], 'corrected': [...]}
+    """
+    results = {'success': [], 'failed': [], 'corrected': []}
+    pending_rows = []
+    pending_results = []
     
-    for i, (address, note) in enumerate(addresses_with_notes):
-        progress = (i + 1) / len(addresses_with_notes)
-        progress_bar.progress(progress)
-        status_text.text(f"Géocodage en cours... ({i+1}/{len(addresses_with_notes)})")
-        
-        lat, lon = geocode_address_france(address)
-        
+    for address, note, lat, lon in geocoded:
         if lat is not None and lon is not None:
             # Valider et corriger si nécessaire
             lat, lon, is_valid, message = validate_france_coordinates(lat, lon, address)
             
             if is_valid:
-                try:
-                    sheet.append_row([address, float(lat), float(lon), note], value_input_option='USER_ENTERED')
-                    if message:  # Correction appliquée
-                        results['corrected'].append((address, note, message))
-                    else:
-                        results['success'].append((address, note))
-                except Exception as e:
-                    results['failed'].append((address, note, f"Erreur: {e}"))
+                pending_rows.append([address, float(lat), float(lon), note])
+                pending_results.append((address, note, message))
             else:
                 results['failed'].append((address, note, message))
         else:
             results['failed'].append((address, note, "Géocodage échoué"))
     
-    progress_bar.empty()
-    status_text.empty()
+    if pending_rows:
+        try:
+            add_addresses_bulk(sheet, pending_rows)
+            for address, note, message in pending_results:
+                if message:  # Correction appliquée
+                    results['corrected'].append((address, note, message))
+                else:
+                    results['success'].append((address, note))
+        except Exception as e:
+            for address, note, _ in pending_results:
+                results['failed'].append((address, note, f"Erreur: {e}"))
+    
+    return results
+
+def add_addresses_batch(sheet, addresses_with_notes, existing_df=None):
+    """
+    Ajoute plusieurs adresses en mode batch (une seule écriture dans le Google Sheet)
+    Coordonnées déjà connues d'abord, puis un seul appel au endpoint CSV de l'API Adresse,
+    puis Photon pour les adresses non trouvées ou au score insuffisant
+    """
+    rejected = [(a, n) for a, n in addresses_with_notes if not looks_geocodable(a)]
+    if rejected:
+        addresses_with_notes = [(a, n) for a, n in addresses_with_notes if looks_geocodable(a)]
+    
+    addresses = [address for address, _ in addresses_with_notes]
+    keys = [normalize_address(address) for address in addresses]
+    known = known_coordinates(existing_df)
+    coords = [known.get(key) for key in keys]
+    
+    # Une adresse saisie plusieurs fois n'est géocodée qu'une fois
+    first_index = {}
+    pending = [
+        i for i, c in enumerate(coords)
+        if c is None and first_index.setdefault(keys[i], i) == i
+    ]
+    bulk_found = {}
+    bulk_ok = False
+    
+    def fallback(i):
+        # Via le cache disque : Photon n'est pas réinterrogé aux imports suivants
+        if bulk_ok:
+            return geocode_address_france(addresses[i], bulk_found=bulk_found.get(i))
+        return geocode_address_france(addresses[i])
+    
+    if pending:
+        # Un seul widget d'état : les étapes s'y ajoutent au lieu de redessiner la page
+        with st.status(f"🔍 Géocodage de {len(pending)} adresse(s)...") as status:
+            try:
+                bulk = bulk_geocode_france([addresses[i] for i in pending])
+                bulk_ok = True
+                for i, lat, lon, score in zip(pending, bulk['latitude'], bulk['longitude'], bulk['result_score']):
+                    if pd.isna(lat) or pd.isna(lon) or pd.isna(score) or not is_in_france(lat, lon):
+                        continue
+                    if score >= GEOCODE_SCORE_FALLBACK:
+                        bulk_found[i] = (float(lat), float(lon), float(score))
+                    if score >= GEOCODE_SCORE_MIN:
+                        # Aucun appel réseau : le résultat du lot est seulement mis en cache
+                        coords[i] = geocode_address_france(addresses[i], bulk_found=bulk_found[i])
+                found = sum(coords[i] is not None for i in pending)
+                st.write(f"API Adresse (lot) : {found}/{len(pending)} adresse(s) trouvée(s)")
+            except Exception:
+                # Endpoint CSV indisponible : géocodage adresse par adresse
+                st.write("Géocodage groupé indisponible, passage adresse par adresse")
+            
+            missing = [i for i in pending if coords[i] is None]
+            if missing:
+                progress_bar = st.progress(0)
+                
+                # Géocodage concurrent : les appels réseau se recouvrent au lieu de s'enchaîner
+                with create_thread_pool(max_workers=BATCH_GEOCODE_WORKERS) as executor:
+                    futures = {executor.submit(fallback, i): i for i in missing}
+                    for done, future in enumerate(as_completed(futures), 1):
+                        coords[futures[future]] = future.result()
+                        progress_bar.progress(
+                            done / len(missing),
+                            text=f"Géocodage individuel... ({done}/{len(missing)})"
+                        )
+            
+            status.update(label="✅ Géocodage terminé", state="complete", expanded=False)
+    
+    for i, key in enumerate(keys):
+        if coords[i] is None:
+            coords[i] = coords[first_index[key]]
     
+    geocoded = [
+        (address, note, lat, lon)
+        for (address, note), (lat, lon) in zip(addresses_with_notes, coords)
+    ]
+    results = write_geocoded_addresses(sheet, geocoded)
+    results['failed'].extend((address, note, "Adresse invalide") for address, note in rejected)
     return results
 
-def add_address(sheet, address, note=""):
+def add_address(sheet, address, note="", existing_df=None):
     """Ajoute une nouvelle adresse avec validation"""
-    if not address.strip():
+    if not looks_geocodable(address):
         st.warning("⚠️ Veuillez entrer une adresse valide.")
         return False
     
     with st.spinner("🔍 Géocodage en cours..."):
-        lat, lon = geocode_address_france(address)
+        lat, lon = locate_address(address, existing_df)
         
         if lat is None or lon is None:
             st.error(f"❌ Impossible de géocoder : {address}")
@@ -407,7 +818,7 @@ def add_address(sheet, address, note=""):
             st.warning(message)
         
         try:
-            sheet.append_row([address, float(lat), float(lon), note], value_input_option='USER_ENTERED')
+            add_addresses_bulk(sheet, [[address, float(lat), float(lon), note]])
             if note:
                 st.success(f"✅ Adresse ajoutée : {address} (📝 {note})")
             else:
@@ -418,11 +829,71 @@ def add_address(sheet, address, note=""):
             st.error(f"❌ Erreur : {e}")
             return False
 
-def delete_address(sheet, index):
-    """Supprime une adresse"""
+def sheet_rows_match(sheet, expected):
+    """
+    Relit la colonne A (hors cache) et vérifie que chaque ligne ciblée contient
+    toujours l'adresse attendue ; expected : {ligne du sheet: adresse normalisée}
+    """
+    fetch_addresses.clear()
+    column = sheet.col_values(1)
+    return all(
+        row <= len(column) and normalize_address(column[row - 1]) == key
+        for row, key in expected.items()
+    )
+
+def delete_addresses(sheet, indices, existing_df):
+    """
+    Supprime plusieurs adresses en un seul appel batch_update
+    indices : étiquettes d'index de existing_df (ligne du sheet = index + 2)
+    """
+    expected = {int(i) + 2: existing_df.at[i, '_key'] for i in indices}
+    rows = sorted(expected, reverse=True)
+    if not rows:
+        return False
+    
+    # existing_df peut dater de 60 s : une ligne modifiée directement dans le
+    # Google Sheet décalerait la suppression vers une autre adresse
     try:
-        sheet.delete_rows(index + 2)
-        st.success("✅ Adresse supprimée !")
+        unchanged = sheet_rows_match(sheet, expected)
+    except Exception as e:
+        st.error(f"❌ Erreur : {e}")
+        return False
+    if not unchanged:
+        st.error("❌ Le Google Sheet a été modifié entre-temps : suppression annulée, vérifiez la liste puis recommencez.")
+        return False
+    
+    # Lignes consécutives regroupées en plages [début, fin[ (indices 0-based)
+    ranges = []
+    for row in rows:
+        if ranges and ranges[-1][0] == row:
+            ranges[-1][0] = row - 1
+        else:
+            ranges.append([row - 1, row])
+    
+    # Du bas vers le haut : chaque suppression laisse intactes les plages restantes
+    requests_body = [
+        {
+            'deleteDimension': {
+                'range': {
+                    'sheetId': sheet.id,
+                    'dimension': 'ROWS',
+                    'startIndex': start,
+                    'endIndex': end,
+                }
+            }
+        }
+        for start, end in ranges
+    ]
+    
+    try:
+        # Après une erreur 5xx, la suppression n'est rejouée que si les lignes
+        # ciblées sont toujours en place (sinon elle a peut-être déjà eu lieu)
+        with_sheets_retry(
+            sheet.spreadsheet.batch_update, {'requests': requests_body},
+            recheck=lambda: sheet_rows_match(sheet, expected)
+        )
+        fetch_addresses.clear()
+        st.success(f"✅ {len(rows)} adresse(s) supprimée(s) !")
         return True
     except Exception as e:
         st.error(f"❌ Erreur : {e}")
@@ -432,30 +903,19 @@ def delete_address(sheet, index):
 # VISUALISATION CARTE
 # ============================================================================
 
-def display_map(df, tile_layer='OpenStreetMap'):
-    """Affiche les adresses sur une carte avec choix de layer"""
-    if df.empty:
-        st.info("🔭 Aucune adresse à afficher.")
-        m = create_empty_france_map(tile_layer)
-        st_folium(m, width=1400, height=600, returned_objects=[])
-        return
-    
-    france_coords = df[
-        df['Latitude'].between(FRANCE_LAT_MIN, FRANCE_LAT_MAX) &
-        df['Longitude'].between(FRANCE_LON_MIN, FRANCE_LON_MAX)
-    ].copy()
-    
-    if france_coords.empty:
-        st.warning("⚠️ Aucune coordonnée valide en France métropolitaine.")
-        st.info("💡 Les coordonnées sont automatiquement corrigées à l'affichage.")
-        
-        with st.expander("🔍 Diagnostic des coordonnées"):
-            diag_df = df[['Adresse', 'Latitude', 'Longitude', 'Note']].copy()
-            st.dataframe(diag_df, use_container_width=True)
-        
-        m = create_empty_france_map(tile_layer)
-        st_folium(m, width=1400, height=600, returned_objects=[])
-        return
+@st.cache_data(show_spinner=False)
+def _render_empty_map_html(tile_layer='OpenStreetMap'):
+    """HTML de la carte vide centrée sur la France"""
+    return create_empty_france_map(tile_layer).get_root().render()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _render_map_html(france_coords, tile_layer='OpenStreetMap'):
+    """
+    Construit la carte Folium des adresses et retourne son HTML
+    Mis en cache par contenu du DataFrame : pas de reconstruction aux reruns
+    """
+    import folium
+    from folium.plugins import FastMarkerCluster
     
     if len(france_coords) == 1:
         row = france_coords.iloc[0]
@@ -464,49 +924,131 @@ def display_map(df, tile_layer='OpenStreetMap'):
         
         m = folium.Map(location=[lat, lon], zoom_start=14, tiles=tile_layer)
         
-        # Ajouter les différentes couches
-        folium.TileLayer('OpenStreetMap', name='Standard').add_to(m)
-        folium.TileLayer(
-            tiles='https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}',
-            attr='Esri',
-            name='Satellite',
-            overlay=False,
-            control=True
-        ).add_to(m)
-        folium.LayerControl().add_to(m)
+        add_base_layers(m)
         
         create_marker(lat, lon, row['Adresse'], note).add_to(m)
     else:
-        center_lat = france_coords['Latitude'].mean()
-        center_lon = france_coords['Longitude'].mean()
+        lats = france_coords['Latitude'].to_numpy(dtype=float)
+        lons = france_coords['Longitude'].to_numpy(dtype=float)
+        addresses = france_coords['Adresse'].to_numpy(dtype=object)
+        notes = france_coords['Note'].fillna('').to_numpy(dtype=object)
         
-        m = folium.Map(location=[center_lat, center_lon], zoom_start=8, tiles=tile_layer)
+        # Un seul passage min/max par colonne : centre et emprise en découlent
+        lat_min, lat_max = lats.min(), lats.max()
+        lon_min, lon_max = lons.min(), lons.max()
+        center_lat = (lat_min + lat_max) * 0.5
+        center_lon = (lon_min + lon_max) * 0.5
         
-        # Ajouter les différentes couches
-        folium.TileLayer('OpenStreetMap', name='Standard').add_to(m)
-        folium.TileLayer(
-            tiles='https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}',
-            attr='Esri',
-            name='Satellite',
-            overlay=False,
-            control=True
-        ).add_to(m)
-        folium.LayerControl().add_to(m)
+        # Canvas plutôt que SVG : les cercles (grands volumes) ne créent plus un nœud DOM chacun
+        m = folium.Map(
+            location=[center_lat, center_lon],
+            zoom_start=8,
+            tiles=tile_layer,
+            prefer_canvas=True
+        )
         
-        for _, row in france_coords.iterrows():
-            note = row.get('Note', '')
-            create_marker(float(row['Latitude']), float(row['Longitude']), row['Adresse'], note).add_to(m)
+        add_base_layers(m)
         
-        sw = france_coords[['Latitude', 'Longitude']].min().values.tolist()
-        ne = france_coords[['Latitude', 'Longitude']].max().values.tolist()
-        m.fit_bounds([sw, ne], padding=[30, 30])
+        # Un seul tableau JS : les marqueurs sont construits côté navigateur
+        markers_data = [
+            [lat, lon, build_popup_html(lat, lon, address, note), build_tooltip_text(address, note)]
+            for lat, lon, address, note in zip(lats.tolist(), lons.tolist(), addresses, notes)
+        ]
+        callback = CIRCLE_MARKER_CALLBACK_JS if len(markers_data) > CIRCLE_MARKER_THRESHOLD else MARKER_CALLBACK_JS
+        FastMarkerCluster(markers_data, callback=callback, options=MARKER_CLUSTER_OPTIONS).add_to(m)
+        
+        m.fit_bounds([[lat_min, lon_min], [lat_max, lon_max]], padding=[30, 30])
     
-    st_folium(m, width=1400, height=600, returned_objects=[])
+    return m.get_root().render()
+
+def display_map(df, tile_layer='OpenStreetMap'):
+    """Affiche les adresses sur une carte avec choix de layer"""
+    if df.empty:
+        st.info("🔭 Aucune adresse à afficher.")
+        components.html(_render_empty_map_html(tile_layer), width=1400, height=600)
+        return
+    
+    if '_in_france' in df.columns:
+        mask = df['_in_france'].to_numpy()
+    else:
+        mask = is_in_france_vec(df['Latitude'], df['Longitude'])
+    france_coords = df.iloc[mask]  # lecture seule : pas de copie
+    
+    if france_coords.empty:
+        st.warning("⚠️ Aucune coordonnée valide en France métropolitaine.")
+        st.info("💡 Les coordonnées sont automatiquement corrigées à l'affichage.")
+        
+        with st.expander("🔍 Diagnostic des coordonnées"):
+            st.dataframe(df[SHEET_HEADERS], use_container_width=True)
+        
+        components.html(_render_empty_map_html(tile_layer), width=1400, height=600)
+        return
+    
+    components.html(_render_map_html(france_coords, tile_layer), width=1400, height=600)
 
 # ============================================================================
 # INTERFACE PRINCIPALE
 # ============================================================================
 
+def _read_csv_columns(uploaded_file, sep):
+    """Relit le fichier depuis le début avec le séparateur donné"""
+    uploaded_file.seek(0)
+    csv_df = pd.read_csv(uploaded_file, dtype=str, sep=sep).fillna('')
+    return csv_df, {col.strip().lower(): col for col in csv_df.columns}
+
+def read_addresses_csv(uploaded_file):
+    """Lit un CSV importé et retourne une liste de tuples (adresse, note)"""
+    try:
+        try:
+            csv_df, columns = _read_csv_columns(uploaded_file, ',')
+        except pd.errors.ParserError:
+            columns = {}
+        
+        if 'adresse' not in columns:
+            # Autre séparateur (export Excel français) : détecté sur l'en-tête,
+            # parmi CSV_DELIMITERS uniquement
+            uploaded_file.seek(0)
+            header = uploaded_file.readline()
+            if isinstance(header, bytes):
+                header = header.decode('utf-8', errors='replace')
+            sep = csv.Sniffer().sniff(header, delimiters=CSV_DELIMITERS).delimiter
+            csv_df, columns = _read_csv_columns(uploaded_file, sep)
+    except csv.Error:
+        return []  # Une seule colonne, qui n'est pas « Adresse »
+    except Exception as e:
+        st.error(f"❌ Fichier CSV illisible : {e}")
+        return []
+    
+    if 'adresse' not in columns:
+        return []
+    
+    addresses = csv_df[columns['adresse']].str.strip()
+    notes = csv_df[columns['note']].str.strip() if 'note' in columns else pd.Series('', index=csv_df.index)
+    return [(address, note) for address, note in zip(addresses, notes) if address]
+
+def display_batch_results(results):
+    """Affiche le bilan d'un ajout multiple et rafraîchit si des adresses ont été ajoutées"""
+    if results['success']:
+        st.success(f"✅ {len(results['success'])} adresse(s) ajoutée(s) !")
+        with st.expander("✅ Adresses ajoutées"):
+            for addr, note in results['success']:
+                st.write(f"• {addr}" + (f" 📝 _{note}_" if note else ""))
+    
+    if results['corrected']:
+        st.warning(f"⚠️ {len(results['corrected'])} adresse(s) corrigée(s)")
+        with st.expander("⚠️ Corrections appliquées"):
+            for addr, note, msg in results['corrected']:
+                st.write(f"• {addr}: {msg}")
+    
+    if results['failed']:
+        st.error(f"❌ {len(results['failed'])} adresse(s) échouée(s)")
+        with st.expander("❌ Échecs"):
+            for addr, note, reason in results['failed']:
+                st.write(f"• {addr} - {reason}")
+    
+    if results['success'] or results['corrected']:
+        st.rerun()
+
 def main():
     st.title("🏠 Gestion de mes pass PTT et codes")
     st.caption("Propriété intellectuelle de Tristan BANNIER")
@@ -518,12 +1060,14 @@ def main():
     page = st.sidebar.radio("Navigation", ["📝 Gestion des adresses", "🗺️ Carte interactive"], index=0)
     
     if st.sidebar.button("🔄 Rafraîchir les données"):
+        fetch_addresses.clear()
         st.rerun()
     
     if page == "📝 Gestion des adresses":
         st.header("📝 Gestion des adresses")
+        df = get_all_addresses(sheet)
         
-        input_mode = st.radio("Mode de saisie", ["➕ Adresse simple", "📋 Adresses multiples"], horizontal=True)
+        input_mode = st.radio("Mode de saisie", ["➕ Adresse simple", "📋 Adresses multiples", "📄 Import CSV"], horizontal=True)
         
         if input_mode == "➕ Adresse simple":
             with st.form("add_address_form", clear_on_submit=True):
@@ -539,9 +1083,9 @@ def main():
                 submitted = st.form_submit_button("Ajouter l'adresse", use_container_width=True)
                 
                 if submitted:
-                    if add_address(sheet, new_address, new_note):
+                    if add_address(sheet, new_address, new_note, existing_df=df):
                         st.rerun()
-        else:
+        elif input_mode == "📋 Adresses multiples":
             with st.form("add_addresses_batch_form", clear_on_submit=True):
                 st.subheader("📋 Ajouter plusieurs adresses")
                 
@@ -565,55 +1109,59 @@ def main():
                                 else:
                                     st.write(f"{i}. **{addr}**")
                         
-                        results = add_addresses_batch(sheet, addresses_with_notes)
-                        
-                        if results['success']:
-                            st.success(f"✅ {len(results['success'])} adresse(s) ajoutée(s) !")
-                            with st.expander("✅ Adresses ajoutées"):
-                                for addr, note in results['success']:
-                                    st.write(f"• {addr}" + (f" 📝 _{note}_" if note else ""))
-                        
-                        if results['corrected']:
-                            st.warning(f"⚠️ {len(results['corrected'])} adresse(s) corrigée(s)")
-                            with st.expander("⚠️ Corrections appliquées"):
-                                for addr, note, msg in results['corrected']:
-                                    st.write(f"• {addr}: {msg}")
-                        
-                        if results['failed']:
-                            st.error(f"❌ {len(results['failed'])} adresse(s) échouée(s)")
-                            with st.expander("❌ Échecs"):
-                                for addr, note, reason in results['failed']:
-                                    st.write(f"• {addr} - {reason}")
-                        
-                        if results['success'] or results['corrected']:
-                            st.rerun()
+                        results = add_addresses_batch(sheet, addresses_with_notes, existing_df=df)
+                        display_batch_results(results)
                     else:
                         st.warning("⚠️ Aucune adresse détectée.")
+        else:
+            with st.form("import_csv_form", clear_on_submit=True):
+                st.subheader("📄 Importer un fichier CSV")
+                
+                st.info("💡 Le fichier doit contenir une colonne **Adresse** et optionnellement une colonne **Note**.")
+                st.caption("Les adresses sont géocodées en une seule requête à l'API Adresse.")
+                
+                uploaded_file = st.file_uploader("Fichier CSV", type=["csv"])
+                
+                submitted_csv = st.form_submit_button("Importer les adresses", use_container_width=True)
+                
+                if submitted_csv and uploaded_file is not None:
+                    addresses_with_notes = read_addresses_csv(uploaded_file)
+                    
+                    if addresses_with_notes:
+                        st.info(f"📊 {len(addresses_with_notes)} adresse(s) détectée(s)")
+                        results = add_addresses_batch(sheet, addresses_with_notes, existing_df=df)
+                        display_batch_results(results)
+                    else:
+                        st.warning("⚠️ Aucune adresse détectée. Vérifiez la colonne 'Adresse'.")
         
         st.divider()
         
         st.subheader("📋 Liste des adresses")
-        df = get_all_addresses(sheet)
         
         if not df.empty:
-            display_df = df.copy()
-            display_df['Latitude'] = display_df['Latitude'].apply(lambda x: f"{x:.6f}")
-            display_df['Longitude'] = display_df['Longitude'].apply(lambda x: f"{x:.6f}")
-            display_df = display_df[['Adresse', 'Note', 'Latitude', 'Longitude']]
-            
-            st.dataframe(display_df, use_container_width=True, hide_index=False)
+            st.dataframe(
+                df[['Adresse', 'Note', 'Latitude', 'Longitude']],
+                use_container_width=True,
+                hide_index=False,
+                column_config=COORDINATES_COLUMN_CONFIG
+            )
             st.write(f"**Total : {len(df)} adresse(s)**")
             
-            with st.expander("🗑️ Supprimer une adresse"):
-                selected_idx = st.selectbox(
-                    "Sélectionnez une adresse à supprimer",
-                    options=range(len(df)),
-                    format_func=lambda x: f"{x+1}. {df.iloc[x]['Adresse']}" + 
-                                         (f" ({df.iloc[x]['Note']})" if df.iloc[x]['Note'] else "")
+            with st.expander("🗑️ Supprimer des adresses"):
+                # Clés = étiquettes d'index : elles pointent vers la bonne ligne du sheet
+                # même quand des lignes sans coordonnées ont été écartées
+                labels = {
+                    idx: f"{i}. {addr}" + (f" ({note})" if note else "")
+                    for i, (idx, addr, note) in enumerate(zip(df.index, df['Adresse'].tolist(), df['Note'].tolist()), 1)
+                }
+                selected = st.multiselect(
+                    "Sélectionnez les adresses à supprimer",
+                    options=list(labels),
+                    format_func=labels.__getitem__
                 )
                 
-                if st.button("🗑️ Supprimer cette adresse", type="secondary"):
-                    if delete_address(sheet, selected_idx):
+                if st.button("🗑️ Supprimer la sélection", type="secondary", disabled=not selected):
+                    if delete_addresses(sheet, selected, df):
                         st.rerun()
         else:
             st.info("🔭 Aucune adresse enregistrée.")
@@ -625,29 +1173,34 @@ def main():
         df = get_all_addresses(sheet)
         
         if not df.empty:
-            valid_coords = df[
-                df['Latitude'].between(FRANCE_LAT_MIN, FRANCE_LAT_MAX) &
-                df['Longitude'].between(FRANCE_LON_MIN, FRANCE_LON_MAX)
-            ]
+            n_valid = int(df['_in_france'].sum())
             
-            st.success(f"📍 {len(valid_coords)} adresses affichées sur {len(df)} totales")
+            st.success(f"📍 {n_valid} adresses affichées sur {len(df)} totales")
             
-            if len(valid_coords) < len(df):
-                st.warning(f"⚠️ {len(df) - len(valid_coords)} adresse(s) hors France (coordonnées invalides)")
+            if n_valid < len(df):
+                st.warning(f"⚠️ {len(df) - n_valid} adresse(s) hors France (coordonnées invalides)")
             
-            st.info("💡 **Cliquer sur un marqueur** pour voir les détails et accéder à Street View. Utilisez le contrôle en haut à droite pour changer de vue (Standard/Satellite).")
+            simple_mode = st.toggle(
+                "⚡ Mode simple (rapide)",
+                value=n_valid > SIMPLE_MAP_THRESHOLD,
+                help="Carte WebGL sans popups ni Street View, fluide même avec des milliers d'adresses"
+            )
             
-            display_map(df)
+            if simple_mode:
+                st.map(df[df['_in_france']], latitude='Latitude', longitude='Longitude', size=20)
+            else:
+                st.info("💡 **Cliquer sur un marqueur** pour voir les détails et accéder à Street View. Utilisez le contrôle en haut à droite pour changer de vue (Standard/Satellite).")
+                display_map(df)
             
             with st.expander("📊 Détails des adresses"):
-                display_df = df.copy()
-                display_df['Latitude'] = display_df['Latitude'].apply(lambda x: f"{x:.6f}")
-                display_df['Longitude'] = display_df['Longitude'].apply(lambda x: f"{x:.6f}")
-                display_df = display_df[['Adresse', 'Note', 'Latitude', 'Longitude']]
-                st.dataframe(display_df, use_container_width=True)
+                st.dataframe(
+                    df[['Adresse', 'Note', 'Latitude', 'Longitude']],
+                    use_container_width=True,
+                    column_config=COORDINATES_COLUMN_CONFIG
+                )
         else:
             st.info("🔭 Aucune adresse à afficher. Ajoutez des adresses depuis la page 'Gestion des adresses'.")
-            display_map(pd.DataFrame(columns=['Adresse', 'Latitude', 'Longitude', 'Note']))
+            display_map(pd.DataFrame(columns=SHEET_HEADERS))
 
 if __name__ == "__main__":
     main()
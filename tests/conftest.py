@@ -0,0 +1,14 @@
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+@pytest.fixture(scope="session")
+def app():
+    """Module app importé hors de `streamlit run` (st.stop y est sans effet)"""
+    pytest.importorskip("streamlit")
+    return importlib.import_module("app")
@@ -0,0 +1,28 @@
+import io
+
+
+def read(app, text):
+    return app.read_addresses_csv(io.BytesIO(text.encode('utf-8')))
+
+
+def test_single_column_file(app):
+    assert read(app, "Adresse\nTour Eiffel\nLouvre\n") == [("Tour Eiffel", ""), ("Louvre", "")]
+
+
+def test_comma_separated_file(app):
+    text = 'Adresse,Note\n"Tour Eiffel, Paris",vue\nLouvre,\n'
+    assert read(app, text) == [("Tour Eiffel, Paris", "vue"), ("Louvre", "")]
+
+
+def test_semicolon_separated_file(app):
+    text = "Adresse;Note\nTour Eiffel, Paris;vue\nLouvre;\n"
+    assert read(app, text) == [("Tour Eiffel, Paris", "vue"), ("Louvre", "")]
+
+
+def test_semicolon_separated_file_without_commas(app):
+    text = "Adresse;Note\nTour Eiffel;vue\n"
+    assert read(app, text) == [("Tour Eiffel", "vue")]
+
+
+def test_missing_address_column(app):
+    assert read(app, "Nom\nTour Eiffel\n") == []
@@ -0,0 +1,21 @@
+def test_parse_splits_on_commas_and_extracts_notes(app):
+    parsed = app.parse_addresses_with_notes("Tour Eiffel (vue imprenable), Arc de Triomphe, , Louvre (musée)")
+    assert parsed == [
+        ("Tour Eiffel", "vue imprenable"),
+        ("Arc de Triomphe", ""),
+        ("Louvre", "musée"),
+    ]
+
+
+def test_parse_keeps_line_break_inside_note(app):
+    parsed = app.parse_addresses_with_notes("Tour Eiffel (vue\nimprenable), Louvre")
+    assert parsed == [("Tour Eiffel", "vue\nimprenable"), ("Louvre", "")]
+
+
+def test_parse_does_not_split_on_line_breaks(app):
+    assert app.parse_addresses_with_notes("Tour Eiffel\nLouvre") == [("Tour Eiffel\nLouvre", "")]
+
+
+def test_parse_keeps_first_note_and_drops_the_others(app):
+    parsed = app.parse_addresses_with_notes("Louvre (musée) Paris (centre)")
+    assert parsed == [("Louvre Paris", "musée")]